@@ -1,21 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
+import re
+import json
 import fitz
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import uuid
 import time
+import threading
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 import numpy as np
+import torch
 
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+try:
+    import simsimd
+except ImportError:  # Optional: fall back to NumPy for similarity scoring
+    simsimd = None
+
+# In-memory dtype of quantized similarity matrices: SimSIMD consumes int8 directly,
+# while the NumPy fallback keeps an exact float32 copy so queries run as a BLAS GEMV
+SIMILARITY_DTYPE = np.int8 if simsimd is not None else np.float32
 
 # Import our database models
 from models import (
-    db, init_database, create_indexes,
+    db, init_database, create_indexes, quantize_embeddings,
     ChatSession, PDFDocument, PDFChunk, ChatMessage,
     get_session, get_session_pdfs, get_session_chunks,
     get_chat_history, save_chat_message, delete_pdf_and_chunks,
@@ -26,6 +42,7 @@ load_dotenv()
 
 # Configuration
 UPLOAD_FOLDER = "uploads"
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
@@ -43,21 +60,62 @@ db.init_app(app)
 # API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
-
-# Load embedding model
+GROQ_TIMEOUT = (3.05, 30)  # (connect, read) seconds
+
+# Reuse TCP/TLS connections to Groq across requests
+_GROQ_SESSION = requests.Session()
+_GROQ_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3)
+))
+
+# In-process cache of per-session chunk indexes: session_id -> (version, index)
+SESSION_INDEX_CACHE_SIZE = 128
+SESSION_VERSIONS_SIZE = 1024
+_SESSION_INDEX = OrderedDict()
+_SESSION_VERSIONS = OrderedDict()  # session_id -> version, LRU-capped
+_SESSION_VERSION_COUNTER = itertools.count(1)
+_SESSION_INDEX_LOCK = threading.Lock()
+
+# Semantic cache of answered questions: session_id -> (version, entries)
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_SIZE = 64  # entries per session
+SEMANTIC_CACHE_SESSIONS = 16  # sessions kept, so at most 1024 entries overall
+_SEMANTIC_CACHE = OrderedDict()
+_SEMANTIC_CACHE_LOCK = threading.Lock()
+
+# Background PDF processing: job_id -> job state, oldest first
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '1'))
+PDF_JOB_HISTORY_SIZE = 256  # finished jobs beyond this are forgotten, oldest first
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=PDF_WORKERS)
+_PDF_JOBS = OrderedDict()
+_PDF_JOBS_LOCK = threading.Lock()
+
+# Embedding dimension of all-MiniLM-L6-v2; fixed so similarity kernels see one shape
+EMBED_DIM = 384
+
+# Load embedding model (FP16 on GPU halves memory traffic; CPU stays FP32)
 print("🔄 Loading embedding model...")
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-print("✅ Embedding model loaded successfully!")
+EMBEDDING_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+embedding_model = SentenceTransformer("all-MiniLM-L6-v2", device=EMBEDDING_DEVICE)
+if EMBEDDING_DEVICE == "cuda":
+    embedding_model.half()
+print(f"✅ Embedding model loaded successfully on {EMBEDDING_DEVICE}!")
+
+def warm_up_embedding_model():
+    """Run one encode so the first user request doesn't pay lazy initialization costs"""
+    embedding_model.encode(["warmup"], convert_to_tensor=True, show_progress_bar=False)
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from PDF file"""
     try:
         doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text.strip()
+        try:
+            parts = [page.get_text("text") for page in doc]
+        finally:
+            doc.close()
+        return "".join(parts).strip()
     except Exception as e:
         print(f"[PDF ERROR] Failed to extract text from: {pdf_path} | Error: {str(e)}")
         return ""
@@ -69,35 +127,167 @@ def chunk_text(text, max_chunk_size=400, overlap=50):
     if not text.strip():
         return []
     
-    sentences = text.split(". ")
+    overlap_words = overlap // 10  # Rough overlap
     chunks = []
-    current_chunk = ""
+    buf = []
+    buf_len = 0
     
-    for sentence in sentences:
+    for sentence in _SENTENCE_RE.split(text):
         sentence = sentence.strip()
         if not sentence:
             continue
+        
+        # Close the current chunk if adding this sentence exceeds the limit
+        if buf and buf_len + len(sentence) + 1 >= max_chunk_size:  # +1 for the joining space
+            chunks.append(" ".join(buf))
             
-        # Check if adding this sentence exceeds the limit
-        if len(current_chunk) + len(sentence) + 2 < max_chunk_size:  # +2 for ". "
-            current_chunk += sentence + ". "
-        else:
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-            
-            # Start new chunk with overlap
-            if len(chunks) > 0 and overlap > 0:
-                # Take last few words from previous chunk for overlap
-                prev_words = current_chunk.split()[-overlap//10:]  # Rough overlap
-                current_chunk = " ".join(prev_words) + " " + sentence + ". "
-            else:
-                current_chunk = sentence + ". "
+            # Start new chunk with the last few words of the previous chunk as overlap
+            tail = buf[-1].split()[-overlap_words:] if overlap_words > 0 else []
+            buf = [" ".join(tail)] if tail else []
+            buf_len = len(buf[0]) + 1 if buf else 0
+        
+        buf.append(sentence)
+        buf_len += len(sentence) + 1
     
     # Add the last chunk
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    if buf:
+        chunks.append(" ".join(buf))
     
-    return [chunk for chunk in chunks if len(chunk.strip()) > 20]  # Filter very short chunks
+    return [chunk for chunk in chunks if len(chunk) > 20]  # Filter very short chunks
+
+def encode_chunks(chunks, batch_size=64):
+    """
+    Embed all chunks in a single batched call.
+    Chunks are sorted by length so each batch pads to a similar size,
+    then the embeddings are returned in the original chunk order.
+    """
+    if not chunks:
+        return np.empty((0, EMBED_DIM), dtype=np.float32)
+
+    order = np.argsort([len(chunk) for chunk in chunks], kind="stable")
+    sorted_embeddings = embedding_model.encode(
+        [chunks[i] for i in order],
+        batch_size=batch_size,
+        convert_to_tensor=False,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+
+    embeddings = np.empty(sorted_embeddings.shape, dtype=np.float32)
+    embeddings[order] = sorted_embeddings
+    return embeddings
+
+def compute_similarities(chunk_embeddings, chunk_scales, query_embedding):
+    """
+    Cosine similarity between a query vector and every row of a quantized chunk matrix.
+    The matrix must already be stored as SIMILARITY_DTYPE (see build_session_index).
+    """
+    query_quantized, query_scales = quantize_embeddings(query_embedding)
+    
+    if simsimd is not None:
+        raw_scores = np.asarray(simsimd.cdist(query_quantized, chunk_embeddings, metric="dot"), dtype=np.float32)[0]
+    else:
+        # int8 products summed over EMBED_DIM (384) dims stay below 2**24, so float32 accumulation is exact
+        raw_scores = chunk_embeddings.dot(query_quantized[0].astype(np.float32))
+    
+    # Undo the per-vector quantization scales; embeddings are L2-normalized so this is cosine
+    return raw_scores / (query_scales[0] * chunk_scales)
+
+def process_pdf(session_id, filepath, filename, original_filename, file_size):
+    """Extract, chunk and embed a saved PDF, then store it for RAG"""
+    text = extract_text_from_pdf(filepath)
+    if not text.strip():
+        raise ValueError(f"Could not extract text from {original_filename}")
+
+    # Create PDF record in database
+    pdf_doc = PDFDocument(
+        session_id=session_id,
+        filename=filename,
+        original_filename=original_filename,
+        file_path=filepath,
+        file_size=file_size
+    )
+    db.session.add(pdf_doc)
+    db.session.flush()  # Get the PDF ID
+
+    # Chunk the text
+    chunks = chunk_text(text)
+    print(f"[CHUNKING] Created {len(chunks)} chunks for {original_filename}")
+
+    # Generate all embeddings in one batched call
+    embeddings = encode_chunks(chunks)
+    if embeddings.shape[1] != EMBED_DIM:
+        raise ValueError(f"Expected {EMBED_DIM}-dim embeddings, got {embeddings.shape[1]}")
+
+    # Store chunk texts in one multi-row insert; row i of the embedding matrix is chunk_index i
+    db.session.bulk_insert_mappings(PDFChunk, [
+        {
+            "pdf_id": pdf_doc.id,
+            "chunk_text": chunk,
+            "chunk_index": i,
+            "chunk_size": len(chunk)
+        }
+        for i, chunk in enumerate(chunks)
+    ])
+    chunk_count = len(chunks)
+
+    # Update PDF with chunk count and embedding matrix
+    pdf_doc.total_chunks = chunk_count
+    pdf_doc.set_embeddings(embeddings)
+    db.session.commit()
+    invalidate_session_index(session_id)
+
+    return {
+        "id": pdf_doc.id,
+        "filename": original_filename,
+        "text_preview": text[:500] + "..." if len(text) > 500 else text,
+        "chunks_created": chunk_count,
+        "file_size": file_size
+    }
+
+def update_pdf_job(job_id, **fields):
+    """Update the tracked state of a PDF processing job"""
+    with _PDF_JOBS_LOCK:
+        _PDF_JOBS[job_id].update(fields)
+
+def run_pdf_job(job_id, session_id, filepath, filename, original_filename, file_size):
+    """Background worker entry point for PDF processing"""
+    update_pdf_job(job_id, status="processing")
+    with app.app_context():
+        try:
+            pdf = process_pdf(session_id, filepath, filename, original_filename, file_size)
+            update_pdf_job(job_id, status="completed", pdf=pdf)
+        except Exception as e:
+            print(f"[PDF PROCESSING ERROR] {original_filename}: {str(e)}")
+            db.session.rollback()
+            if os.path.exists(filepath):
+                os.remove(filepath)  # Clean up unprocessed file
+            update_pdf_job(job_id, status="failed", error=str(e))
+
+def submit_pdf_job(session_id, filepath, filename, original_filename, file_size):
+    """Queue a saved PDF for background processing and return its job ID"""
+    job_id = uuid.uuid4().hex
+    with _PDF_JOBS_LOCK:
+        _PDF_JOBS[job_id] = {
+            "job_id": job_id,
+            "session_id": session_id,
+            "filename": original_filename,
+            "status": "queued",
+            "pdf": None,
+            "error": None
+        }
+        
+        # Drop the oldest finished jobs once the registry is over capacity
+        if len(_PDF_JOBS) > PDF_JOB_HISTORY_SIZE:
+            finished = [jid for jid, job in _PDF_JOBS.items() if job["status"] in ("completed", "failed")]
+            for jid in finished[:len(_PDF_JOBS) - PDF_JOB_HISTORY_SIZE]:
+                del _PDF_JOBS[jid]
+    _PDF_EXECUTOR.submit(run_pdf_job, job_id, session_id, filepath, filename, original_filename, file_size)
+    return job_id
+
+def sse_event(data):
+    """Format a dict as a server-sent event frame"""
+    return f"data: {json.dumps(data)}\n\n"
 
 @app.route("/create_session", methods=["POST"])
 def create_session_endpoint():
@@ -117,7 +307,7 @@ def create_session_endpoint():
 
 @app.route("/upload_pdf", methods=["POST"])
 def upload_pdf():
-    """Upload multiple PDFs and process them for RAG"""
+    """Upload multiple PDFs and queue them for RAG processing"""
     try:
         # Get session ID
         session_id = request.form.get('session_id')
@@ -134,96 +324,59 @@ def upload_pdf():
         if not files or files[0].filename == '':
             return jsonify({"error": "No selected files"}), 400
 
-        uploaded_pdfs = []
+        jobs = []
         processing_errors = []
 
         for file in files:
             try:
-                # Secure filename and save file
+                # Save under a unique disk name; the original name is only kept for display
                 original_filename = file.filename
-                filename = secure_filename(f"{session_id}_{int(time.time())}_{original_filename}")
+                filename = f"{uuid.uuid4().hex}.pdf"
                 filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
                 file.save(filepath)
                 
                 file_size = os.path.getsize(filepath)
                 print(f"[UPLOAD] Saved: {filepath}, Size: {file_size} bytes")
 
-                # Extract text
-                text = extract_text_from_pdf(filepath)
-                if not text.strip():
-                    processing_errors.append(f"Could not extract text from {original_filename}")
-                    os.remove(filepath)  # Clean up empty file
-                    continue
-
-                # Create PDF record in database
-                pdf_doc = PDFDocument(
-                    session_id=session_id,
-                    filename=filename,
-                    original_filename=original_filename,
-                    file_path=filepath,
-                    file_size=file_size
-                )
-                db.session.add(pdf_doc)
-                db.session.flush()  # Get the PDF ID
-
-                # Chunk the text
-                chunks = chunk_text(text)
-                print(f"[CHUNKING] Created {len(chunks)} chunks for {original_filename}")
-
-                # Process and store chunks with embeddings
-                chunk_count = 0
-                for i, chunk in enumerate(chunks):
-                    try:
-                        # Generate embedding
-                        embedding = embedding_model.encode([chunk])[0]
-                        
-                        # Create chunk record
-                        pdf_chunk = PDFChunk(
-                            pdf_id=pdf_doc.id,
-                            chunk_text=chunk,
-                            chunk_index=i,
-                            chunk_size=len(chunk)
-                        )
-                        pdf_chunk.set_embedding(embedding)
-                        db.session.add(pdf_chunk)
-                        chunk_count += 1
-                        
-                    except Exception as e:
-                        print(f"[CHUNK ERROR] Failed to process chunk {i}: {str(e)}")
-                        continue
-
-                # Update PDF with chunk count
-                pdf_doc.total_chunks = chunk_count
-                db.session.commit()
-
-                uploaded_pdfs.append({
-                    "id": pdf_doc.id,
-                    "filename": original_filename,
-                    "text_preview": text[:500] + "..." if len(text) > 500 else text,
-                    "chunks_created": chunk_count,
-                    "file_size": file_size
-                })
+                # Extraction and embedding run in the background
+                job_id = submit_pdf_job(session_id, filepath, filename, original_filename, file_size)
+                jobs.append({"job_id": job_id, "filename": original_filename})
 
             except Exception as e:
-                print(f"[PDF PROCESSING ERROR] {original_filename}: {str(e)}")
-                processing_errors.append(f"Error processing {original_filename}: {str(e)}")
+                print(f"[UPLOAD ERROR] {original_filename}: {str(e)}")
+                processing_errors.append(f"Error uploading {original_filename}: {str(e)}")
                 continue
 
         response_data = {
             "success": True,
-            "uploaded_pdfs": uploaded_pdfs,
-            "total_uploaded": len(uploaded_pdfs)
+            "jobs": jobs,
+            "total_queued": len(jobs)
         }
         
         if processing_errors:
             response_data["warnings"] = processing_errors
 
-        return jsonify(response_data)
+        return jsonify(response_data), 202
 
     except Exception as e:
         print(f"[UPLOAD ERROR] {str(e)}")
         return jsonify({"error": f"Upload failed: {str(e)}"}), 500
 
+@app.route("/pdf_status/<job_id>", methods=["GET"])
+def pdf_status(job_id):
+    """Get the processing status of an uploaded PDF"""
+    with _PDF_JOBS_LOCK:
+        job = _PDF_JOBS.get(job_id)
+        job = dict(job) if job else None
+    
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job
+    })
+
 @app.route("/get_pdfs/<session_id>", methods=["GET"])
 def get_pdfs(session_id):
     """Get all PDFs for a session"""
@@ -257,6 +410,7 @@ def remove_pdf(session_id, pdf_id):
         success = delete_pdf_and_chunks(pdf_id)
         
         if success:
+            invalidate_session_index(session_id)
             return jsonify({
                 "success": True,
                 "message": f"PDF {pdf.original_filename} removed successfully"
@@ -268,56 +422,178 @@ def remove_pdf(session_id, pdf_id):
         print(f"[REMOVE PDF ERROR] {str(e)}")
         return jsonify({"error": "Failed to remove PDF"}), 500
 
-def retrieve_relevant_chunks(session_id, query, top_k=5):
-    """Retrieve most relevant chunks for a query from session's PDFs"""
-    try:
-        chunks = get_session_chunks(session_id)
+def build_session_index(session_id):
+    """Load a session's chunk embeddings and metadata from the database"""
+    chunks = get_session_chunks(session_id)
+    
+    if not chunks:
+        return None
+    
+    # Group chunk rows by PDF (already ordered by pdf_id, chunk_index)
+    chunks_by_pdf = {}
+    for chunk in chunks:
+        chunks_by_pdf.setdefault(chunk.pdf_id, []).append(chunk)
+    
+    # Copy each PDF's embedding matrix into one preallocated (K, EMBED_DIM) matrix,
+    # converting to SIMILARITY_DTYPE once here rather than on every query
+    chunk_embeddings = np.empty((len(chunks), EMBED_DIM), dtype=SIMILARITY_DTYPE)
+    chunk_scales = np.empty(len(chunks), dtype=np.float32)
+    chunk_data = []
+    
+    for pdf in get_session_pdfs(session_id):
+        pdf_chunks = chunks_by_pdf.get(pdf.id)
+        if not pdf_chunks:
+            continue
+        
+        matrix, matrix_scales = pdf.get_embeddings()
+        if matrix is None or matrix.shape != (len(pdf_chunks), EMBED_DIM):
+            print(f"[EMBEDDING ERROR] Missing or mismatched embeddings for PDF {pdf.id}")
+            continue
         
-        if not chunks:
-            return [], []
+        start = len(chunk_data)
+        chunk_embeddings[start:start + len(pdf_chunks)] = matrix
+        chunk_scales[start:start + len(pdf_chunks)] = matrix_scales
+        for chunk in pdf_chunks:
+            chunk_data.append({
+                'text': chunk.chunk_text,
+                'pdf_id': chunk.pdf_id,
+                'pdf_filename': pdf.original_filename,
+                'chunk_index': chunk.chunk_index
+            })
+    
+    if not chunk_data:
+        return None
+    
+    # Trim rows left unused by skipped PDFs (a leading row slice stays C-contiguous)
+    return chunk_embeddings[:len(chunk_data)], chunk_scales[:len(chunk_data)], chunk_data
+
+def _current_session_version(session_id):
+    """
+    Version of a session's cached data; caller must hold _SESSION_INDEX_LOCK.
+    Versions come from a global counter, so a session whose entry was dropped
+    gets a fresh value and anything cached under the old one is never reused.
+    """
+    version = _SESSION_VERSIONS.get(session_id)
+    if version is None:
+        version = _SESSION_VERSIONS[session_id] = next(_SESSION_VERSION_COUNTER)
+        while len(_SESSION_VERSIONS) > SESSION_VERSIONS_SIZE:
+            evicted_session, _ = _SESSION_VERSIONS.popitem(last=False)
+            _SESSION_INDEX.pop(evicted_session, None)
+    else:
+        _SESSION_VERSIONS.move_to_end(session_id)
+    return version
+
+def get_session_index(session_id):
+    """Get a session's chunk index from the in-process cache, building it on a miss"""
+    with _SESSION_INDEX_LOCK:
+        version = _current_session_version(session_id)
+        cached = _SESSION_INDEX.get(session_id)
+        if cached is not None and cached[0] == version:
+            _SESSION_INDEX.move_to_end(session_id)
+            return cached[1]
+    
+    index = build_session_index(session_id)
+    
+    with _SESSION_INDEX_LOCK:
+        # Only cache if no upload/remove happened while we were building
+        if _SESSION_VERSIONS.get(session_id) == version:
+            _SESSION_INDEX[session_id] = (version, index)
+            _SESSION_INDEX.move_to_end(session_id)
+            while len(_SESSION_INDEX) > SESSION_INDEX_CACHE_SIZE:
+                _SESSION_INDEX.popitem(last=False)
+    
+    return index
+
+def invalidate_session_index(session_id):
+    """Drop a session's cached chunk index and answers after its PDFs change"""
+    with _SESSION_INDEX_LOCK:
+        # Forgetting the version is enough: the next access draws a new one
+        _SESSION_VERSIONS.pop(session_id, None)
+        _SESSION_INDEX.pop(session_id, None)
+    with _SEMANTIC_CACHE_LOCK:
+        _SEMANTIC_CACHE.pop(session_id, None)
+
+def get_session_version(session_id):
+    """Current cache version for a session's PDFs"""
+    with _SESSION_INDEX_LOCK:
+        return _current_session_version(session_id)
+
+def lookup_semantic_cache(session_id, version, query_embedding):
+    """Return a cached answer for a near-duplicate question in this session, if any"""
+    with _SEMANTIC_CACHE_LOCK:
+        cached = _SEMANTIC_CACHE.get(session_id)
+        if cached is None or cached[0] != version:
+            return None
+        _SEMANTIC_CACHE.move_to_end(session_id)
+        embeddings, scales, answers = cached[1]
+    
+    similarities = compute_similarities(embeddings, scales, query_embedding)
+    best = int(np.argmax(similarities))
+    if similarities[best] > SEMANTIC_CACHE_THRESHOLD:
+        return answers[best]
+    return None
+
+def store_semantic_cache(session_id, version, query_embedding, answer):
+    """Remember an answer for later near-duplicate questions; oldest entries are dropped first"""
+    quantized, scales = quantize_embeddings(query_embedding)
+    quantized = quantized.astype(SIMILARITY_DTYPE)
+    
+    if get_session_version(session_id) != version:
+        return  # PDFs changed while answering
+    
+    with _SEMANTIC_CACHE_LOCK:
+        cached = _SEMANTIC_CACHE.get(session_id)
+        if cached is not None and cached[0] == version:
+            embeddings, old_scales, answers = cached[1]
+            quantized = np.vstack([embeddings, quantized])[-SEMANTIC_CACHE_SIZE:]
+            scales = np.concatenate([old_scales, scales])[-SEMANTIC_CACHE_SIZE:]
+            answers = (answers + [answer])[-SEMANTIC_CACHE_SIZE:]
+        else:
+            answers = [answer]
         
-        # Get embeddings and chunks
-        chunk_embeddings = []
-        chunk_data = []
+        _SEMANTIC_CACHE[session_id] = (version, (quantized, scales, answers))
+        _SEMANTIC_CACHE.move_to_end(session_id)
+        while len(_SEMANTIC_CACHE) > SEMANTIC_CACHE_SESSIONS:
+            _SEMANTIC_CACHE.popitem(last=False)
+
+def retrieve_relevant_chunks(session_id, query, top_k=5, query_embedding=None):
+    """
+    Retrieve most relevant chunks for a query from session's PDFs.
+    Returns the prompt-ready context string ("Source: ..." blocks) and the contributing PDF IDs.
+    """
+    try:
+        index = get_session_index(session_id)
         
-        for chunk in chunks:
-            try:
-                embedding = chunk.get_embedding()
-                chunk_embeddings.append(embedding)
-                chunk_data.append({
-                    'text': chunk.chunk_text,
-                    'pdf_id': chunk.pdf_id,
-                    'pdf_filename': chunk.pdf_document.original_filename,
-                    'chunk_index': chunk.chunk_index
-                })
-            except Exception as e:
-                print(f"[EMBEDDING ERROR] Could not load embedding for chunk {chunk.id}: {e}")
-                continue
+        if index is None:
+            return "", []
         
-        if not chunk_embeddings:
-            return [], []
+        chunk_embeddings, chunk_scales, chunk_data = index
         
-        # Generate query embedding and find similarities
-        query_embedding = embedding_model.encode([query])
-        similarities = cosine_similarity(query_embedding, chunk_embeddings)[0]
+        # Generate query embedding (unless the caller already has it) and find similarities
+        if query_embedding is None:
+            query_embedding = embedding_model.encode([query], normalize_embeddings=True)[0]
+        similarities = compute_similarities(chunk_embeddings, chunk_scales, query_embedding)
         
-        # Get top-k most similar chunks
-        top_indices = similarities.argsort()[-top_k:][::-1]
+        # Get top-k most similar chunks above the minimum similarity threshold:
+        # O(K) partition, then sort and filter only the k selected
+        top_k = min(top_k, len(similarities))
+        top_indices = np.argpartition(similarities, -top_k)[-top_k:]
+        top_indices = top_indices[np.argsort(-similarities[top_indices])]
+        top_indices = top_indices[similarities[top_indices] > 0.1]
         
-        relevant_chunks = []
+        context_parts = []
         relevant_pdf_ids = set()
         
         for idx in top_indices:
-            if similarities[idx] > 0.1:  # Minimum similarity threshold
-                chunk_info = chunk_data[idx]
-                relevant_chunks.append(chunk_info['text'])
-                relevant_pdf_ids.add(chunk_info['pdf_id'])
+            chunk_info = chunk_data[idx]
+            context_parts.append("Source: " + chunk_info['text'])
+            relevant_pdf_ids.add(chunk_info['pdf_id'])
         
-        return relevant_chunks, list(relevant_pdf_ids)
+        return "\n\n".join(context_parts), list(relevant_pdf_ids)
         
     except Exception as e:
         print(f"[RETRIEVAL ERROR] {str(e)}")
-        return [], []
+        return "", []
 
 @app.route("/chat", methods=["POST"])
 def chat():
@@ -338,23 +614,52 @@ def chat():
         # Ensure session exists
         session = get_session(session_id)
         
+        # Semantic cache: reuse the answer to a near-duplicate question
+        query_embedding = embedding_model.encode([user_message], normalize_embeddings=True)[0]
+        cache_version = get_session_version(session_id)
+        cached = lookup_semantic_cache(session_id, cache_version, query_embedding)
+        
+        if cached is not None:
+            response_time = int((time.time() - start_time) * 1000)
+            save_chat_message(
+                session_id=session_id,
+                user_message=user_message,
+                bot_response=cached["reply"],
+                context_text=cached["context_text"],
+                relevant_pdf_ids=cached["relevant_pdf_ids"],
+                response_time=response_time
+            )
+            
+            def generate_cached():
+                yield sse_event({"delta": cached["reply"]})
+                yield sse_event({
+                    "done": True,
+                    "cache_hit": True,
+                    "context_used": bool(cached["context_text"]),
+                    "sources_count": len(cached["relevant_pdf_ids"]),
+                    "response_time_ms": response_time
+                })
+            
+            return Response(generate_cached(), mimetype="text/event-stream")
+        
         # Get recent chat history for context
         recent_messages = get_chat_history(session_id, limit=5)
         conversation_context = ""
         
         if recent_messages:
             conversation_context = "\n\nRecent conversation:\n"
-            for msg in reversed(recent_messages):  # Reverse to get chronological order
+            for msg in recent_messages:  # Already in chronological order
                 conversation_context += f"User: {msg.user_message[:100]}...\n"
                 conversation_context += f"Assistant: {msg.bot_response[:100]}...\n"
         
         # RAG: Retrieve relevant chunks
-        relevant_chunks, relevant_pdf_ids = retrieve_relevant_chunks(session_id, user_message)
+        relevant_context, relevant_pdf_ids = retrieve_relevant_chunks(
+            session_id, user_message, query_embedding=query_embedding
+        )
         
         # Build context
-        if relevant_chunks:
-            context = "Relevant medical information from uploaded documents:\n\n"
-            context += "\n\n".join([f"Source: {chunk}" for chunk in relevant_chunks])
+        if relevant_context:
+            context = "Relevant medical information from uploaded documents:\n\n" + relevant_context
         else:
             context = "No specific document context available for this query."
         
@@ -389,14 +694,47 @@ Please provide a helpful medical response based on the available context. If the
                 {"role": "user", "content": combined_message}
             ],
             "temperature": 0.3,
-            "max_tokens": 1000
+            "max_tokens": 1000,
+            "stream": True
         }
 
-        response = requests.post(GROQ_API_URL, json=payload, headers=headers)
+        response = _GROQ_SESSION.post(
+            GROQ_API_URL, json=payload, headers=headers, stream=True, timeout=GROQ_TIMEOUT
+        )
         
-        if response.status_code == 200:
+        if response.status_code != 200:
+            print(f"[API ERROR] Status: {response.status_code}, Response: {response.text}")
+            response.close()
+            return jsonify({"error": "Error contacting AI service"}), 500
+
+        def generate():
+            """Forward Groq's SSE deltas to the client, then save the full reply"""
+            reply_parts = []
+            response.encoding = "utf-8"  # text/event-stream would otherwise default to ISO-8859-1
             try:
-                bot_reply = response.json()["choices"][0]["message"]["content"]
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data: "):
+                        continue
+                    
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        break
+                    
+                    try:
+                        delta = json.loads(data)["choices"][0]["delta"].get("content")
+                    except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+                        print(f"[API RESPONSE ERROR] Unexpected stream frame: {data[:200]} ({e})")
+                        continue
+                    
+                    if delta:
+                        reply_parts.append(delta)
+                        yield sse_event({"delta": delta})
+                
+                bot_reply = "".join(reply_parts)
+                if not bot_reply:
+                    print("[API RESPONSE ERROR] Stream ended without any content")
+                    yield sse_event({"error": "Unexpected response format from AI service"})
+                    return
                 
                 # Calculate response time
                 response_time = int((time.time() - start_time) * 1000)
@@ -406,25 +744,32 @@ Please provide a helpful medical response based on the available context. If the
                     session_id=session_id,
                     user_message=user_message,
                     bot_response=bot_reply,
-                    context_chunks=relevant_chunks,
+                    context_text=relevant_context,
                     relevant_pdf_ids=relevant_pdf_ids,
                     response_time=response_time
                 )
                 
-                return jsonify({
-                    "success": True,
+                store_semantic_cache(session_id, cache_version, query_embedding, {
                     "reply": bot_reply,
-                    "context_used": len(relevant_chunks) > 0,
+                    "context_text": relevant_context,
+                    "relevant_pdf_ids": relevant_pdf_ids
+                })
+                
+                yield sse_event({
+                    "done": True,
+                    "cache_hit": False,
+                    "context_used": bool(relevant_context),
                     "sources_count": len(relevant_pdf_ids),
                     "response_time_ms": response_time
                 })
-                
-            except KeyError as e:
-                print(f"[API RESPONSE ERROR] Unexpected response format: {e}")
-                return jsonify({"error": "Unexpected response format from AI service"}), 500
-        else:
-            print(f"[API ERROR] Status: {response.status_code}, Response: {response.text}")
-            return jsonify({"error": "Error contacting AI service"}), 500
+            
+            except Exception as e:
+                print(f"[CHAT STREAM ERROR] {str(e)}")
+                yield sse_event({"error": "Error receiving response from AI service"})
+            finally:
+                response.close()
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream")
 
     except Exception as e:
         print(f"[CHAT ERROR] {str(e)}")
@@ -439,7 +784,7 @@ def get_chat_history_endpoint(session_id):
         
         return jsonify({
             "success": True,
-            "messages": [msg.to_dict() for msg in reversed(messages)],  # Chronological order
+            "messages": [msg.to_dict() for msg in messages],  # Chronological order
             "total_messages": len(messages)
         })
     except Exception as e:
@@ -451,6 +796,7 @@ def clear_chat(session_id):
     """Clear all chat history for a session"""
     try:
         clear_session_data(session_id)
+        invalidate_session_index(session_id)
         return jsonify({
             "success": True,
             "message": "Chat history and PDFs cleared successfully"
@@ -483,6 +829,9 @@ if __name__ == "__main__":
         init_database(app)
         create_indexes()
     
+    print("🔥 Warming up embedding model...")
+    warm_up_embedding_model()
+    
     print("✅ Backend ready!")
     app.run(debug=True, port=5000)
 
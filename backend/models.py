@@ -1,10 +1,37 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import delete, event, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased
 from datetime import datetime
 import pickle
+import sqlite3
 import numpy as np
 
 db = SQLAlchemy()
 
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling so chat reads aren't blocked by upload/clear writes"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+def quantize_embeddings(embeddings):
+    """
+    Quantize float embeddings to int8 with one scale per row.
+    Row i is recovered (approximately) as quantized[i] / scales[i].
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    max_abs = np.abs(embeddings).max(axis=1)
+    scales = np.where(max_abs > 0, 127.0 / np.maximum(max_abs, 1e-12), 1.0).astype(np.float32)
+    quantized = np.round(embeddings * scales[:, None]).astype(np.int8)
+    return np.ascontiguousarray(quantized), scales
+
 class ChatSession(db.Model):
     """Model to track user sessions"""
     __tablename__ = 'chat_sessions'
@@ -40,10 +67,28 @@ class PDFDocument(db.Model):
     file_size = db.Column(db.Integer, nullable=False)  # in bytes
     upload_time = db.Column(db.DateTime, default=datetime.utcnow)
     total_chunks = db.Column(db.Integer, default=0)
+    embeddings_blob = db.Column(db.LargeBinary)  # contiguous int8 matrix, one row per chunk
+    embedding_scales = db.Column(db.LargeBinary)  # float32 quantization scale per row
+    embedding_dim = db.Column(db.Integer)
     
     # Relationships
     chunks = db.relationship('PDFChunk', backref='pdf_document', lazy=True, cascade='all, delete-orphan')
     
+    def set_embeddings(self, embeddings):
+        """Store chunk embeddings as a contiguous int8 matrix plus per-row scales"""
+        quantized, scales = quantize_embeddings(embeddings)
+        self.embeddings_blob = quantized.tobytes()
+        self.embedding_scales = scales.tobytes()
+        self.embedding_dim = quantized.shape[1]
+    
+    def get_embeddings(self):
+        """Retrieve chunk embeddings as an int8 (total_chunks, embedding_dim) matrix and its scales"""
+        if not self.embeddings_blob or not self.embedding_scales:
+            return None, None
+        quantized = np.frombuffer(self.embeddings_blob, dtype=np.int8).reshape(-1, self.embedding_dim)
+        scales = np.frombuffer(self.embedding_scales, dtype=np.float32)
+        return quantized, scales
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -56,7 +101,7 @@ class PDFDocument(db.Model):
         }
 
 class PDFChunk(db.Model):
-    """Model to store PDF text chunks and their embeddings"""
+    """Model to store PDF text chunks (embeddings live on the parent PDFDocument)"""
     __tablename__ = 'pdf_chunks'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -64,17 +109,9 @@ class PDFChunk(db.Model):
     chunk_text = db.Column(db.Text, nullable=False)
     chunk_index = db.Column(db.Integer, nullable=False)
     chunk_size = db.Column(db.Integer, nullable=False)  # length of text
-    embedding_data = db.Column(db.LargeBinary, nullable=False)  # pickled numpy array
+    embedding_data = db.Column(db.LargeBinary)  # legacy pickled embedding, only read by migrate_database
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def set_embedding(self, embedding_vector):
-        """Store embedding as pickled binary data"""
-        self.embedding_data = pickle.dumps(embedding_vector.astype(np.float32))
-    
-    def get_embedding(self):
-        """Retrieve embedding as numpy array"""
-        return pickle.loads(self.embedding_data)
-    
     def to_dict(self):
         return {
             'id': self.id,
@@ -132,27 +169,30 @@ def get_session_pdfs(session_id):
     return PDFDocument.query.filter_by(session_id=session_id).all()
 
 def get_session_chunks(session_id):
-    """Get all chunks for a session"""
-    return db.session.query(PDFChunk).join(PDFDocument).filter(
+    """Get (pdf_id, chunk_index, chunk_text) rows for all chunks in a session"""
+    return db.session.query(
+        PDFChunk.pdf_id, PDFChunk.chunk_index, PDFChunk.chunk_text
+    ).join(PDFDocument).filter(
         PDFDocument.session_id == session_id
-    ).all()
+    ).order_by(PDFChunk.pdf_id, PDFChunk.chunk_index).all()
 
 def get_chat_history(session_id, limit=50):
-    """Get chat history for a session"""
-    return ChatMessage.query.filter_by(session_id=session_id)\
-                           .order_by(ChatMessage.timestamp.desc())\
-                           .limit(limit).all()
+    """Get the most recent messages for a session, oldest first"""
+    recent = ChatMessage.query.filter_by(session_id=session_id)\
+                              .order_by(ChatMessage.timestamp.desc())\
+                              .limit(limit).subquery()
+    recent_message = aliased(ChatMessage, recent)
+    return db.session.query(recent_message).order_by(recent.c.timestamp.asc()).all()
 
-def save_chat_message(session_id, user_message, bot_response, context_chunks=None, relevant_pdf_ids=None, response_time=None):
+def save_chat_message(session_id, user_message, bot_response, context_text=None, relevant_pdf_ids=None, response_time=None):
     """Save a chat message to database"""
-    context_text = "\n---\n".join(context_chunks) if context_chunks else None
     pdf_ids_str = ",".join(map(str, relevant_pdf_ids)) if relevant_pdf_ids else None
     
     message = ChatMessage(
         session_id=session_id,
         user_message=user_message,
         bot_response=bot_response,
-        context_used=context_text,
+        context_used=context_text or None,
         relevant_pdfs=pdf_ids_str,
         response_time_ms=response_time
     )
@@ -172,22 +212,87 @@ def delete_pdf_and_chunks(pdf_id):
     return False
 
 def clear_session_data(session_id):
-    """Clear all data for a session (PDFs, chunks, messages)"""
-    # Delete messages
-    ChatMessage.query.filter_by(session_id=session_id).delete()
-    
-    # Delete PDFs and their chunks (cascade will handle chunks)
-    PDFDocument.query.filter_by(session_id=session_id).delete()
-    
-    db.session.commit()
+    """Clear all data for a session (PDFs, chunks, messages) in one transaction"""
+    session_pdf_ids = select(PDFDocument.id).where(PDFDocument.session_id == session_id)
+    try:
+        # Bulk deletes skip ORM cascades, so remove chunks explicitly
+        db.session.execute(delete(PDFChunk).where(PDFChunk.pdf_id.in_(session_pdf_ids)))
+        db.session.execute(delete(PDFDocument).where(PDFDocument.session_id == session_id))
+        db.session.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
 # Database initialization function
 def init_database(app):
     """Initialize database with app context"""
     with app.app_context():
         db.create_all()
+        migrate_database()
         print("✅ Database tables created successfully!")
 
+def migrate_database():
+    """Bring tables created by older versions up to the current schema (safe to run repeatedly)"""
+    inspector = inspect(db.engine)
+    
+    # Per-PDF embedding matrix columns
+    pdf_columns = {column['name'] for column in inspector.get_columns('pdf_documents')}
+    blob_type = db.LargeBinary().compile(dialect=db.engine.dialect)
+    new_columns = [
+        ('embeddings_blob', blob_type),
+        ('embedding_scales', blob_type),
+        ('embedding_dim', 'INTEGER')
+    ]
+    with db.engine.begin() as conn:
+        for name, column_type in new_columns:
+            if name not in pdf_columns:
+                conn.execute(text(f'ALTER TABLE pdf_documents ADD COLUMN {name} {column_type}'))
+                print(f"✅ Added column pdf_documents.{name}")
+    
+    chunk_columns = {column['name']: column for column in inspector.get_columns('pdf_chunks')}
+    if 'embedding_data' not in chunk_columns:
+        return
+    
+    backfill_legacy_embeddings()
+    
+    # New chunk rows no longer carry embeddings, so the old NOT NULL constraint has to go
+    if not chunk_columns['embedding_data']['nullable']:
+        with db.engine.begin() as conn:
+            if db.engine.dialect.name == 'sqlite':
+                # SQLite can't drop NOT NULL in place; rebuild the table
+                conn.execute(text('ALTER TABLE pdf_chunks RENAME TO pdf_chunks_legacy'))
+                PDFChunk.__table__.create(conn)
+                conn.execute(text(
+                    'INSERT INTO pdf_chunks (id, pdf_id, chunk_text, chunk_index, chunk_size, embedding_data, created_at) '
+                    'SELECT id, pdf_id, chunk_text, chunk_index, chunk_size, embedding_data, created_at FROM pdf_chunks_legacy'
+                ))
+                conn.execute(text('DROP TABLE pdf_chunks_legacy'))
+            else:
+                conn.execute(text('ALTER TABLE pdf_chunks ALTER COLUMN embedding_data DROP NOT NULL'))
+        print("✅ Made pdf_chunks.embedding_data nullable")
+
+def backfill_legacy_embeddings():
+    """Build the per-PDF embedding matrix for PDFs uploaded when embeddings were pickled per chunk"""
+    legacy_pdfs = PDFDocument.query.filter(PDFDocument.embeddings_blob.is_(None)).all()
+    backfilled = 0
+    
+    for pdf in legacy_pdfs:
+        rows = db.session.query(PDFChunk.embedding_data).filter_by(pdf_id=pdf.id)\
+                         .order_by(PDFChunk.chunk_index).all()
+        if not rows or any(row.embedding_data is None for row in rows):
+            continue
+        
+        # Older embeddings weren't normalized; retrieval expects unit vectors
+        matrix = np.vstack([pickle.loads(row.embedding_data) for row in rows]).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        pdf.set_embeddings(matrix / np.maximum(norms, 1e-12))
+        backfilled += 1
+    
+    if backfilled:
+        db.session.commit()
+        print(f"✅ Backfilled embeddings for {backfilled} legacy PDF(s)")
+
 # Optional: Add indexes for better performance
 def create_indexes():
     """Create database indexes for better query performance"""
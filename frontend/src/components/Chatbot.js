@@ -76,42 +76,83 @@ function ChatBox({ sessionId, hasPDFs }) {
     setIsLoading(true);
 
     try {
-      const response = await axios.post('http://localhost:5000/chat', {
-        message: userMessage,
-        session_id: sessionId,
+      // The reply is streamed back as server-sent events, so use fetch instead of axios
+      const response = await fetch('http://localhost:5000/chat', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message: userMessage,
+          session_id: sessionId,
+        }),
       });
 
-      if (response.data.success) {
-        const botReply = response.data.reply;
-        const responseTime = response.data.response_time_ms;
-        const contextUsed = response.data.context_used;
-        const sourcesCount = response.data.sources_count;
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'Failed to get response');
+      }
 
-        // Remove loading message and add actual response
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let botReply = '';
+      let metadata = null;
+
+      // Replace the loading message with the partial reply as it arrives
+      const showReply = (extra = {}) => {
         setMessages(prev => {
-          const withoutLoading = prev.filter(msg => !msg.isLoading);
-          return [...withoutLoading, { 
-            sender: 'bot', 
+          const withoutPending = prev.filter(msg => !msg.isLoading && !msg.isStreaming);
+          return [...withoutPending, {
+            sender: 'bot',
             text: botReply,
-            responseTime: responseTime,
-            contextUsed: contextUsed,
-            sourcesCount: sourcesCount,
-            timestamp: new Date().toISOString()
+            timestamp: new Date().toISOString(),
+            ...extra
           }];
         });
+      };
+
+      while (!metadata) {
+        const { value, done } = await reader.read();
+        if (done) break;
 
-        // Focus input for next message
-        setTimeout(() => inputRef.current?.focus(), 100);
-      } else {
-        throw new Error(response.data.error || 'Unknown error');
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+
+        for (const frame of frames) {
+          if (!frame.startsWith('data: ')) continue;
+          const event = JSON.parse(frame.slice('data: '.length));
+
+          if (event.error) {
+            throw new Error(event.error);
+          } else if (event.done) {
+            metadata = event;
+          } else if (event.delta) {
+            botReply += event.delta;
+            showReply({ isStreaming: true });
+          }
+        }
       }
+
+      if (!metadata) {
+        throw new Error('Response ended unexpectedly');
+      }
+
+      showReply({
+        responseTime: metadata.response_time_ms,
+        contextUsed: metadata.context_used,
+        sourcesCount: metadata.sources_count,
+        cacheHit: metadata.cache_hit
+      });
+
+      // Focus input for next message
+      setTimeout(() => inputRef.current?.focus(), 100);
     } catch (error) {
       console.error('Chat error:', error);
-      const errorMessage = error.response?.data?.error || error.message || 'Failed to get response';
+      const errorMessage = error.message || 'Failed to get response';
       
-      // Remove loading message and add error
+      // Remove loading/partial message and add error
       setMessages(prev => {
-        const withoutLoading = prev.filter(msg => !msg.isLoading);
+        const withoutLoading = prev.filter(msg => !msg.isLoading && !msg.isStreaming);
         return [...withoutLoading, { 
           sender: 'bot', 
           text: `❌ Error: ${errorMessage}`,
@@ -276,6 +317,11 @@ function ChatBox({ sessionId, hasPDFs }) {
                       📚 {msg.sourcesCount} source{msg.sourcesCount !== 1 ? 's' : ''}
                     </span>
                   )}
+                  {msg.cacheHit && (
+                    <span style={styles.metadataItem}>
+                      ⚡ Cached answer
+                    </span>
+                  )}
                 </div>
               )}
             </div>
@@ -1,6 +1,10 @@
 import React, { useState, useRef } from 'react';
 import axios from 'axios';
 
+// Background processing status is polled for at most ~5 minutes per file
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_MAX_ATTEMPTS = 300;
+
 function UploadPDF({ sessionId, onPDFsUploaded }) {
   const [selectedFiles, setSelectedFiles] = useState([]);
   const [isUploading, setIsUploading] = useState(false);
@@ -47,6 +51,19 @@ function UploadPDF({ sessionId, onPDFsUploaded }) {
     setSelectedFiles(validFiles);
   };
 
+  const waitForJob = async (jobId) => {
+    // Poll until the backend finishes extracting and embedding the PDF
+    for (let attempt = 0; attempt < JOB_POLL_MAX_ATTEMPTS; attempt++) {
+      const response = await axios.get(`http://localhost:5000/pdf_status/${jobId}`);
+      const job = response.data.job;
+      if (job.status === 'completed' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+    throw new Error('Timed out waiting for processing');
+  };
+
   const handleUpload = async () => {
     if (selectedFiles.length === 0) {
       setError('Please select at least one PDF file');
@@ -101,13 +118,33 @@ function UploadPDF({ sessionId, onPDFsUploaded }) {
       console.log("PDF Upload Response:", response.data);
 
       if (response.data.success) {
-        const uploadedPDFs = response.data.uploaded_pdfs;
+        // Files are processed in the background; wait for each job independently
+        const queuedJobs = response.data.jobs;
+        const results = await Promise.allSettled(
+          queuedJobs.map(job => waitForJob(job.job_id))
+        );
+        const jobs = results.map((result, index) => (
+          result.status === 'fulfilled'
+            ? result.value
+            : {
+                filename: queuedJobs[index].filename,
+                status: 'failed',
+                error: result.reason?.response?.data?.error || result.reason?.message || 'Processing status unavailable'
+              }
+        ));
+        const uploadedPDFs = jobs.filter(job => job.status === 'completed').map(job => job.pdf);
+        const warnings = [
+          ...(response.data.warnings || []),
+          ...jobs.filter(job => job.status === 'failed').map(job => `${job.filename}: ${job.error}`)
+        ];
         
-        // Update progress to completed
-        selectedFiles.forEach(file => {
+        // Update progress per file
+        jobs.forEach(job => {
           setUploadProgress(prev => ({
             ...prev,
-            [file.name]: { status: 'completed', progress: 100 }
+            [job.filename]: job.status === 'completed'
+              ? { status: 'completed', progress: 100 }
+              : { status: 'failed', progress: 0 }
           }));
         });
 
@@ -124,8 +161,8 @@ function UploadPDF({ sessionId, onPDFsUploaded }) {
         }
 
         // Show warnings if any
-        if (response.data.warnings && response.data.warnings.length > 0) {
-          setError(`Warnings: ${response.data.warnings.join(', ')}`);
+        if (warnings.length > 0) {
+          setError(`Warnings: ${warnings.join(', ')}`);
         }
 
         // Clear success message after 3 seconds